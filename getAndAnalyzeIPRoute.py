@@ -14,9 +14,10 @@
 	which was already setup to analyze 'show ip route' output. I included the template in this script if the file is not present.
 	
 	The user will be prompted for the username and password to use for logging into the devices.
-	
+
 	Arguments:
-		None
+		--username <name> (optional) - username for the device logins; if omitted the user is prompted for it
+		--password-env <var> (optional) - environment variable holding the login password (default NPL_PASS); if the variable is not set the user is prompted
 	
 	Outputs:
 		1) Text with the analysis of the show ip route commands from each device
@@ -25,14 +26,16 @@
 # import modules HERE
 
 # import the standard Python modules
-import sys											# this allows us to analyze the arguments	
+import sys											# this allows us to analyze the arguments
 import os											# this allows us to check on the file
-from datetime import datetime						# useful for getting timing information and for some data translation from Excel files
-from contextlib import contextmanager
+import argparse										# command line argument handling
+from datetime import datetime						# useful for getting timing information
+from collections import defaultdict			# group routes per protocol in a single pass
 import getpass											# for username and password information
+import io												# in-memory file objects - used to feed the template to textfsm
 import logging											# log output, issues, etc
-import time
-import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed	# run the per-device work in parallel
 
 # import any extras
 try:
@@ -40,13 +43,6 @@ try:
 except:
 	print("Need to have textfsm installed. Try:\n  pip<version> install textfsm")
 	sys.exit()
-try:
-	import xlrd											# this allows us to import an Excel file
-	import xlwt											# this allows us to output data to an Excel file
-	from xlutils.copy import copy as excel_copy_rdwt	# this allows a workbook read in to be converted to a workbook that can be written
-except:
-	print("Excel packages need to be installed. Try:\n  pip<version> install xlrd\n  pip<version> install xlwt\n  pip<version> install xlutils")
-	sys.exit()
 try:
 	from netmiko import ConnectHandler					# this will be used to establish SSH connections with devices, send commands, and retrieve output
 except:
@@ -67,11 +63,9 @@ __email__ = "rhallinan@netcraftsmen.com"
 	20190603 - Initial version
 """
 
-@contextmanager
-def open_file(path, mode):
-	the_file = open(path, mode)
-	yield the_file
-	the_file.close()
+# formatters are stateless, so build them once at module scope instead of per loggerSetup call
+consoleLogFormat = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
+fileLogFormat = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
 def loggerSetup(fileName,loggerName):
 	# setup the logger to log with the file name provided (directory would be logs/<fileName>
@@ -79,13 +73,12 @@ def loggerSetup(fileName,loggerName):
 
 	logFile = 'logs' + os.sep + fileName
 
-	# check to make sure that the logs directory exists
-	if not os.path.isdir('logs'):
-		try:
-			os.mkdir('logs')
-		except:
-			print("Can't make the directory. Exiting...")
-			sys.exit()		
+	# make sure that the logs directory exists
+	try:
+		os.makedirs('logs', exist_ok=True)
+	except:
+		print("Can't make the directory. Exiting...")
+		sys.exit()
 
 	# Create a custom logger
 	logger = logging.getLogger(loggerName)
@@ -97,11 +90,9 @@ def loggerSetup(fileName,loggerName):
 	c_handler.setLevel(logging.CRITICAL)
 	f_handler.setLevel(logging.DEBUG)
 
-	# Create formatters and add it to handlers
-	c_format = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
-	f_format = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-	c_handler.setFormatter(c_format)
-	f_handler.setFormatter(f_format)
+	# Add the shared formatters to the handlers
+	c_handler.setFormatter(consoleLogFormat)
+	f_handler.setFormatter(fileLogFormat)
 
 	# Add handlers to the logger
 	logger.addHandler(c_handler)
@@ -109,133 +100,91 @@ def loggerSetup(fileName,loggerName):
 
 	return logger
 
-def getUserInfo():
+def getUserInfo(loginName=None, passwordEnv=None):
 
-	# let's get the username from the user:
-	loginConf = "N"
-	while loginConf != "Y":
+	# let's get the username from the user - a single prompt, no confirmation
+	# loop; anyone scripting this can pass --username on the command line
+	if not loginName:
 		loginName = input("Please enter the username you wish to use for logins into devices: ")
-		loginConf = input("You have entered the following username: \"" + loginName + "\". Is this correct (Y/N)? ")
-		loginConf = loginConf.upper()
 
 	print("The following username will be used for logins: " + loginName)
 
+	# take the password from the environment variable named by --password-env
+	# when it is set, so cron/CI runs never block on a prompt
+	if passwordEnv:
+		userPass = os.environ.get(passwordEnv)
+		if userPass:
+			return loginName,userPass
+
 	# let's get the password from the user
-	passPrompt=getpass
 	userPass=""
 	userPassConf=""
 	while (userPass == "" and userPassConf == "") or (userPass != userPassConf):			# i.e. check for the initial condition where both are empty or if they don't match
-		userPass = passPrompt.getpass()
-		userPassConf = passPrompt.getpass("Reenter the password: ")
+		userPass = getpass.getpass()
+		userPassConf = getpass.getpass("Reenter the password: ")
 		if userPass != userPassConf:
 			print("Passwords do not match. Please try again....")
 	
 	return loginName,userPass
 
 
-def build_iproute_template():
-	""" 
-	This is the information for the show ip route template. It comes directly from:
-		https://github.com/networktocode/ntc-templates/blob/master/templates/cisco_ios_show_ip_route.template
-	This script will make this file.	
-	"""
-
-	fileContents = [
-		'Value Filldown PROTOCOL (\w)\n', 
-		'Value Filldown TYPE (\w{0,2})\n', 
-		'Value Required,Filldown NETWORK (\d{1,3}.\d{1,3}.\d{1,3}.\d{1,3})\n', 
-		'Value Filldown MASK (\d{1,2})\n', 
-		'Value DISTANCE (\d+)\n', 
-		'Value METRIC (\d+)\n', 
-		'Value NEXTHOP_IP (\d{1,3}.\d{1,3}.\d{1,3}.\d{1,3})\n', 
-		'Value NEXTHOP_IF ([A-Z][\w\-\.:/]+)\n', 
-		'Value UPTIME (\d[\w:\.]+)\n', 
-		'\n', 
-		'Start\n', 
-		'  ^Gateway.* -> Routes\n', 
-		'\n', 
-		'Routes\n', 
-		'  # For "is (variably )subnetted" line, capture mask, clear all values.\n', 
-		'  ^\s+\d{1,3}.\d{1,3}.\d{1,3}.\d{1,3}\/${MASK}\sis -> Clear\n', 
-		'  #\n', 
-		'  # Match directly connected route with explicit mask\n', 
-		'  ^${PROTOCOL}(\s|\*)${TYPE}\s+${NETWORK}\/${MASK}\sis\sdirectly\sconnected,\s${NEXTHOP_IF} -> Record\n', 
-		'  #\n', 
-		'  # Match directly connected route (mask is inherited from "is subnetted")\n', 
-		'  ^${PROTOCOL}(\s|\*)${TYPE}\s+${NETWORK}\sis\sdirectly\sconnected,\s${NEXTHOP_IF} -> Record\n', 
-		'  #\n',
-		'  # Match regular routes, with mask, where all data in same line\n',
-		'  ^${PROTOCOL}(\s|\*)${TYPE}\s+${NETWORK}\/${MASK}\s\[${DISTANCE}/${METRIC}\]\svia\s${NEXTHOP_IP}(,\s${UPTIME})?(,\s${NEXTHOP_IF})? -> Record\n',
-		'  #\n',
-		'  # Match regular route, all one line, where mask is learned from "is subnetted" line\n',
-		'  ^${PROTOCOL}(\s|\*)${TYPE}\s+${NETWORK}\s\[${DISTANCE}\/${METRIC}\]\svia\s${NEXTHOP_IP}(,\s${UPTIME})?(,\s${NEXTHOP_IF})? -> Record\n',
-		'  #\n',
-		'  # Match route with no via statement (Null via protocol)\n',
-		'  ^${PROTOCOL}(\s|\*)${TYPE}\s+${NETWORK}\/${MASK}\s\[${DISTANCE}/${METRIC}\],\s${UPTIME},\s${NEXTHOP_IF} -> Record\n',
-		'  #\n',
-		'  # Match "is a summary" routes (often Null0)\n',
-		'  ^${PROTOCOL}(\s|\*)${TYPE}\s+${NETWORK}\/${MASK}\sis\sa\ssummary,\s${UPTIME},\s${NEXTHOP_IF} -> Record\n',
-		'  #\n',
-		'  # Match regular routes where the network/mask is on the line above the rest of the route\n',
-		'  ^${PROTOCOL}(\s|\*)${TYPE}\s+${NETWORK}\/${MASK} -> Next\n',
-		'  #\n',
-		'  # Match regular routes where the network only (mask from subnetted line) is on the line above the rest of the route\n',
-		'  ^${PROTOCOL}(\s|\*)${TYPE}\s+${NETWORK} -> Next\n',
-		'  #\n',
-		'  # Match the rest of the route information on line below network (and possibly mask)\n',
-		'  ^\s+\[${DISTANCE}\/${METRIC}\]\svia\s${NEXTHOP_IP}(,\s${UPTIME})?(,\s${NEXTHOP_IF})? -> Record\n',
-		'  #\n',
-		'  # Match load-balanced routes\n',
-		'  ^\s+\[${DISTANCE}\/${METRIC}\]\svia\s${NEXTHOP_IP} -> Record\n',
-		'  #\n',
-		'  # Clear all variables on empty lines\n',
-		'  ^\s* -> Clearall\n',
-		'\n',
-		'EOF\n',	
-	]
-
-	with tempfile.TemporaryFile('w+t') as curTemplate:
-		# build the tempfile with the template information
-		curTemplate.writelines(fileContents)
-
-		# go to the beginning of the file
-		curTemplate.seek(0)
-		
-		# build the parser
-		parser = textfsm.TextFSM(curTemplate)
-
-		return parser
-
-def outputExcel(listOutput,fileName,tabName):
-	""" listOutput: this should be a list of lists; first item should be header file which should be written.
-		fileName: Name of the Excel file to which this data should be written
-		tabName: Name of the tab to which this data should be written
-	"""
-
-	# since before this would get called - it is assumed that the file was initialized - if the file now exists it is because another
-	# tab is already in it from this script - thus check to see if the file is there - if so then just open workbook using xlrd
-	if os.path.exists(fileName):
-		outBook = xlrd.open_workbook(fileName)
-		outBookNew = excel_copy_rdwt(outBook)
-		outBook = outBookNew
-	else:	
-		# make the new Workbook object
-		outBook = xlwt.Workbook()
-
-	# add the sheet with the tab name specified
-	thisSheet = outBook.add_sheet(tabName)
-
-	# get number of columns
-	numCols=len(listOutput[0])
-
-	for rowNum in range(len(listOutput)):
-		writeRow = thisSheet.row(rowNum)
-		# print(listOutput[rowNum])
-		for x in range(numCols):
-			writeRow.write(x,str(listOutput[rowNum][x]))
-			
-	# save it to the Excel sheet at the end
-	outBook.save(fileName)
+# This is the show ip route template. It comes directly from:
+#	https://github.com/networktocode/ntc-templates/blob/master/templates/cisco_ios_show_ip_route.template
+# One raw module-level string, frozen at import time - nothing is ever written
+# to disk, and the dots in the IP octet patterns are escaped so '.' can't
+# match arbitrary characters.
+ipRouteTemplate = r"""Value Filldown PROTOCOL (\w)
+Value Filldown TYPE (\w{0,2})
+Value Required,Filldown NETWORK (\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})
+Value Filldown MASK (\d{1,2})
+Value DISTANCE (\d+)
+Value METRIC (\d+)
+Value NEXTHOP_IP (\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})
+Value NEXTHOP_IF ([A-Z][\w\-\.:/]+)
+Value UPTIME (\d[\w:\.]+)
+
+Start
+  ^Gateway.* -> Routes
+
+Routes
+  # For "is (variably )subnetted" line, capture mask, clear all values.
+  ^\s+\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}\/${MASK}\sis -> Clear
+  #
+  # Match directly connected route with explicit mask
+  ^${PROTOCOL}(\s|\*)${TYPE}\s+${NETWORK}\/${MASK}\sis\sdirectly\sconnected,\s${NEXTHOP_IF} -> Record
+  #
+  # Match directly connected route (mask is inherited from "is subnetted")
+  ^${PROTOCOL}(\s|\*)${TYPE}\s+${NETWORK}\sis\sdirectly\sconnected,\s${NEXTHOP_IF} -> Record
+  #
+  # Match regular routes, with mask, where all data in same line
+  ^${PROTOCOL}(\s|\*)${TYPE}\s+${NETWORK}\/${MASK}\s\[${DISTANCE}/${METRIC}\]\svia\s${NEXTHOP_IP}(,\s${UPTIME})?(,\s${NEXTHOP_IF})? -> Record
+  #
+  # Match regular route, all one line, where mask is learned from "is subnetted" line
+  ^${PROTOCOL}(\s|\*)${TYPE}\s+${NETWORK}\s\[${DISTANCE}\/${METRIC}\]\svia\s${NEXTHOP_IP}(,\s${UPTIME})?(,\s${NEXTHOP_IF})? -> Record
+  #
+  # Match route with no via statement (Null via protocol)
+  ^${PROTOCOL}(\s|\*)${TYPE}\s+${NETWORK}\/${MASK}\s\[${DISTANCE}/${METRIC}\],\s${UPTIME},\s${NEXTHOP_IF} -> Record
+  #
+  # Match "is a summary" routes (often Null0)
+  ^${PROTOCOL}(\s|\*)${TYPE}\s+${NETWORK}\/${MASK}\sis\sa\ssummary,\s${UPTIME},\s${NEXTHOP_IF} -> Record
+  #
+  # Match regular routes where the network/mask is on the line above the rest of the route
+  ^${PROTOCOL}(\s|\*)${TYPE}\s+${NETWORK}\/${MASK} -> Next
+  #
+  # Match regular routes where the network only (mask from subnetted line) is on the line above the rest of the route
+  ^${PROTOCOL}(\s|\*)${TYPE}\s+${NETWORK} -> Next
+  #
+  # Match the rest of the route information on line below network (and possibly mask)
+  ^\s+\[${DISTANCE}\/${METRIC}\]\svia\s${NEXTHOP_IP}(,\s${UPTIME})?(,\s${NEXTHOP_IF})? -> Record
+  #
+  # Match load-balanced routes
+  ^\s+\[${DISTANCE}\/${METRIC}\]\svia\s${NEXTHOP_IP} -> Record
+  #
+  # Clear all variables on empty lines
+  ^\s* -> Clearall
+
+EOF
+"""
 
 def establishSSHConnect(dstEndpoint,deviceType,userName,userPassword):
 
@@ -244,7 +193,7 @@ def establishSSHConnect(dstEndpoint,deviceType,userName,userPassword):
 				  'host': dstEndpoint,
 				  'username': userName,
 				  'password': userPassword,
-				  'global_delay_factor': 2,
+				  'fast_cli': True,
 				}
 
 	# connect to the device
@@ -259,6 +208,67 @@ def establishSSHConnect(dstEndpoint,deviceType,userName,userPassword):
 
 	return new_connection
 
+# the textfsm parser is shared across the worker threads - serialize access to it
+parseLock = threading.Lock()
+
+# protocol code -> name used in the report, in the order the lines are printed
+routeProtocols = (
+	("C", "connected"),
+	("D", "EIGRP"),
+	("L", "Local"),
+	("O", "OSPF"),
+	("S", "static"),
+)
+
+def per_device(deviceIP, loginName, userPass, re_table):
+	""" Log in to a single device, run 'show ip route', and parse the output.
+		Returns a set of the unique (protocol, network, mask) tuples, or False if no connection could be made.
+	"""
+
+	# build the SSH connection
+	net_connect = establishSSHConnect(deviceIP, 'cisco_ios', loginName, userPass)
+	if type(net_connect) == type(bool()):
+		# this means a return of False which means that there was no connection made - so done with this device
+		return False
+
+	# execute the command on the device - the output is just a string, no
+	# need to spool it through a temporary file; clear_buffer already drops
+	# any leftover banner output, so no settle-time sleep is needed
+	shRouteOutput = ""
+	try:
+		net_connect.clear_buffer()
+		shRouteOutput = net_connect.send_command('show ip route')
+	except Exception as e:
+		thisLogger.exception(e)
+	try:
+		net_connect.disconnect()
+	except Exception as e:
+		thisLogger.exception(e)
+
+	# cheap literal prefilter before handing the output to textfsm: the parser
+	# only starts recording at the "Gateway of last resort" line, so skip the
+	# codes legend above it - and skip the parse entirely if it never appears
+	gatewayIndex = shRouteOutput.find("Gateway")
+	if gatewayIndex == -1:
+		thisLogger.warning("No 'Gateway' line in the output from " + deviceIP + " - nothing to parse.")
+		routeInfo = []
+	else:
+		# back up to the start of the line so the parser's ^Gateway rule still sees it
+		gatewayIndex = shRouteOutput.rfind("\n", 0, gatewayIndex) + 1
+		with parseLock:
+			# reset the parser state left over from the previous device before parsing
+			re_table.Reset()
+			routeInfo = re_table.ParseText(shRouteOutput[gatewayIndex:])
+
+	# get a set of the unique protocol, network, and mask - look the field
+	# positions up in the template header rather than hard-coding them
+	protocolIdx = re_table.header.index("PROTOCOL")
+	networkIdx = re_table.header.index("NETWORK")
+	maskIdx = re_table.header.index("MASK")
+	uniqueRoutes = { (eachItem[protocolIdx], eachItem[networkIdx], eachItem[maskIdx]) for eachItem in routeInfo }
+
+	return uniqueRoutes
+
 def main(system_arguments):
 
 	#***********************************
@@ -266,6 +276,13 @@ def main(system_arguments):
 	#* Initial global setups
 	#*
 	#***********************************
+	# parse any command line arguments first so --help and bad flags exit
+	# before anything (like the log file) is created
+	argParser = argparse.ArgumentParser(description="Log in to the routers, read 'show ip route', and summarize the routes per protocol.")
+	argParser.add_argument("--username", help="username to use for device logins (skips the interactive prompt)")
+	argParser.add_argument("--password-env", default="NPL_PASS", help="environment variable to read the device login password from (default: NPL_PASS); prompts if it is not set")
+	scriptArgs = argParser.parse_args(system_arguments[1:])
+
 	global curTime
 	curTime = datetime.utcnow().strftime("%Y%m%d%H%M")
 
@@ -285,69 +302,52 @@ def main(system_arguments):
 	# thisLogger.debug('This is a debug test')
 
 	# get user password info
-	loginName, userPass = getUserInfo()	
+	loginName, userPass = getUserInfo(scriptArgs.username, scriptArgs.password_env)
 	
 	# define a list of the private IP addresses we should log in to
 	ipAddressList = ['10.102.3.11', '10.102.3.12', '10.102.3.13']
 
-	# build the template
-	re_table = build_iproute_template()
+	# build the parser straight from the in-memory template text - no file round-trip needed
+	re_table = textfsm.TextFSM(io.StringIO(ipRouteTemplate))
+
+	# each device is independent and the work is I/O bound on SSH latency - so run them all in parallel
+	deviceRoutes = {}
+	with ThreadPoolExecutor(max_workers=len(ipAddressList)) as executor:
+		futureToIP = { executor.submit(per_device, deviceIP, loginName, userPass, re_table): deviceIP for deviceIP in ipAddressList }
+		for eachFuture in as_completed(futureToIP):
+			deviceRoutes[futureToIP[eachFuture]] = eachFuture.result()
 
-	# loop through each device
+	# print the reports sequentially at the end so the output isn't interleaved
 	for deviceIP in ipAddressList:
 
-		# build the SSH connection
-		net_connect = establishSSHConnect(deviceIP, 'cisco_ios', loginName, userPass)
-		if type(net_connect) == type(bool()):
-			# this means a return of False which means that there was no connection made - so done with this device
-			continue		
-
-		# # read in the template file
-		# with open('cisco_ios_show_ip_route.template','r') as fileIn:
-			# re_table = textfsm.TextFSM(fileIn)
-			
-		with tempfile.TemporaryFile('w+t') as shRoute:
-			# execute the command on the device
-			time.sleep(1)
-			try:
-				net_connect.clear_buffer()
-				shRoute.writelines(net_connect.send_command('show ip route'))
-			except Exception as e:
-				thisLogger.exception(e)
-			try:
-				net_connect.disconnect()
-			except Exception as e:
-				thisLogger.exception(e)
-
-			# read in the data - first seek to 0, then parse it
-			shRoute.seek(0)
-			routeInfo = re_table.ParseText(shRoute.read())
-
-		# reset the parser after each run
-		re_table.Reset()
-
-		# get a set of the unique protocol, network, and mask
-		# protocol is field 0, network is field 2, mask is field 3
-		uniqueRoutes = set()
-		for eachItem in routeInfo:
-			uniqueRoutes.add((eachItem[0],eachItem[2],eachItem[3]))
-
-		# print out a report for the user
-		print("\n" * 2)
-		print("************************************************")
-		print("*                                              *")
-		print("*       Route Summary for " + deviceIP + "          *")
-		print("*                                              *")
-		print("************************************************")
-		print()
-		print("The following device's ip route table was analyzed: " + deviceIP)
-		print()
-		print("The number of connected routes is: " + str(len([ x for x in uniqueRoutes if x[0]=="C" ])))
-		print("The number of EIGRP routes is: " + str(len([ x for x in uniqueRoutes if x[0]=="D" ])))
-		print("The number of Local routes is: " + str(len([ x for x in uniqueRoutes if x[0]=="L" ])))
-		print("The number of OSPF routes is: " + str(len([ x for x in uniqueRoutes if x[0]=="O" ])))
-		print("The number of static routes is: " + str(len([ x for x in uniqueRoutes if x[0]=="S" ])))
-		print("\n" * 1)
+		uniqueRoutes = deviceRoutes[deviceIP]
+		if type(uniqueRoutes) == type(bool()):
+			# this means a return of False which means that there was no connection made - so nothing to report for this device
+			continue
+
+		# group the routes by protocol in one pass - the report only needs the
+		# counts, but the full per-protocol lists also go to the debug log
+		routesByProtocol = defaultdict(list)
+		for eachRoute in uniqueRoutes:
+			routesByProtocol[eachRoute[0]].append(eachRoute)
+		for protocolCode, protocolRoutes in sorted(routesByProtocol.items()):
+			thisLogger.debug("Routes on " + deviceIP + " for protocol " + protocolCode + ": " + str(sorted(protocolRoutes)))
+
+		# build the whole report and emit it with one write instead of a dozen prints
+		reportLines = [
+			"\n" * 2,
+			"************************************************",
+			"*                                              *",
+			f"*       Route Summary for {deviceIP}          *",
+			"*                                              *",
+			"************************************************",
+			"",
+			f"The following device's ip route table was analyzed: {deviceIP}",
+			"",
+		]
+		reportLines.extend(f"The number of {protocolName} routes is: {len(routesByProtocol.get(protocolCode, ()))}" for protocolCode, protocolName in routeProtocols)
+		reportLines.append("\n")
+		sys.stdout.write("\n".join(reportLines) + "\n")
 
 if __name__ == "__main__":
 